@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
-from flask import Flask, request, redirect, render_template_string, flash, url_for
-import os, shutil, datetime, ipaddress, fcntl, time
+from flask import Flask, request, redirect, flash, url_for, make_response, get_flashed_messages
+from markupsafe import escape
+import os, ipaddress, time, threading, bisect, stat
 
 app = Flask(__name__)
 app.secret_key = 'changeme'
@@ -9,6 +10,7 @@ app.secret_key = 'changeme'
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 IP_FILE = os.path.join(SCRIPT_DIR, 'allowed_ips.txt')
 VERSIONS_DIR = os.path.join(SCRIPT_DIR, 'versions')
+MAX_VERSIONS = 100  # Number of backups kept in VERSIONS_DIR; older ones are deleted
 
 # Make sure the versions directory exists
 try:
@@ -22,50 +24,172 @@ except OSError as e:
     if not os.path.exists(VERSIONS_DIR):
         os.makedirs(VERSIONS_DIR)
 
+# Parsed contents of IP_FILE, keyed on its mtime, inode and size so unchanged files are not
+# re-read. Every save (including rollbacks) replaces the file with a new inode, which also
+# catches writes from other worker processes that land within the filesystem's timestamp
+# granularity.
+# The key and list are stored as one tuple so concurrent threads always see a matching pair.
+_ip_cache = {"entry": (None, [])}
+
+def _parse_ips(text):
+    """Split the contents of IP_FILE into a list of IP address strings."""
+    return [line for line in map(str.strip, text.splitlines()) if line]
+
 def load_ips():
-    """Read the list of IP addresses from the file with file locking."""
-    if not os.path.exists(IP_FILE):
-        return []
+    """Read the list of IP addresses from the file.
+
+    Returns (ips, key), where key identifies the file version the list came from and is
+    None when the file does not exist. The parsed list is cached and only re-read when
+    the file changes, so it must not be modified in place. No lock is taken: writers
+    os.replace() the file, so an open file is never partially written.
+    """
+    try:
+        st = os.stat(IP_FILE)
+    except FileNotFoundError:
+        return [], None
+    key = (st.st_mtime_ns, st.st_ino, st.st_size)
+    cached_key, cached_ips = _ip_cache["entry"]
+    if key == cached_key:
+        return cached_ips, key
     
-    max_retries = 5
-    for attempt in range(max_retries):
+    try:
+        f = open(IP_FILE, 'r')
+    except FileNotFoundError:
+        return [], None  # Removed between the stat and the open
+    with f:
+        ips = _parse_ips(f.read())
+        # Key the cache on the file we actually read
+        st = os.fstat(f.fileno())
+    key = (st.st_mtime_ns, st.st_ino, st.st_size)
+    _ip_cache["entry"] = (key, ips)
+    return ips, key
+
+# Sorted backup file names, keyed on the versions directory's mtime
+_versions_cache = {"mtime": -1, "list": []}
+
+def list_versions(use_cache=True):
+    """Return the backup file names in VERSIONS_DIR, newest first.
+
+    The listing is cached and only re-scanned when the directory's mtime changes.
+    Pass use_cache=False to force a fresh scan, e.g. when the result gates a rollback.
+    """
+    mtime = os.stat(VERSIONS_DIR).st_mtime_ns
+    if not use_cache or mtime != _versions_cache["mtime"]:
+        with os.scandir(VERSIONS_DIR) as it:
+            names = [entry.name for entry in it if entry.is_file()]
+        names.sort(reverse=True)
+        _versions_cache.update(mtime=mtime, list=names)
+    return _versions_cache["list"]
+
+def _prune_versions(keep=MAX_VERSIONS):
+    """Delete all but the newest `keep` backups from VERSIONS_DIR."""
+    with os.scandir(VERSIONS_DIR) as it:
+        entries = sorted((e for e in it if e.is_file()), key=lambda e: e.name, reverse=True)
+    for entry in entries[keep:]:
         try:
-            with open(IP_FILE, 'r') as f:
-                fcntl.flock(f.fileno(), fcntl.LOCK_SH)  # Shared lock for reading
-                return [line.strip() for line in f if line.strip()]
-        except (IOError, OSError) as e:
-            if attempt < max_retries - 1:
-                time.sleep(0.1)  # Brief delay before retry
-                continue
-            else:
-                # If we can't get the lock after retries, return empty list
-                return []
-
-def save_ips(ips):
-    """Before saving, archive the current file to a versioned copy, then write new content with file locking."""
-    max_retries = 5
-    for attempt in range(max_retries):
+            os.unlink(entry.path)
+        except FileNotFoundError:
+            pass  # Already removed by a concurrent writer
+    _versions_cache["mtime"] = -1
+
+# (second, '%Y%m%d_%H%M%S' prefix) of the last backup name, so strftime runs at most once a second
+_backup_prefix_cache = {"entry": (-1, "")}
+
+def _backup_name():
+    """Return a backup file path in VERSIONS_DIR timestamped with microsecond precision."""
+    sec, usec = divmod(time.time_ns() // 1000, 1_000_000)
+    cached_sec, prefix = _backup_prefix_cache["entry"]
+    if sec != cached_sec:
+        prefix = time.strftime('%Y%m%d_%H%M%S', time.localtime(sec))
+        _backup_prefix_cache["entry"] = (sec, prefix)
+    return os.path.join(VERSIONS_DIR, f'allowed_ips_{prefix}_{usec:06d}.txt')
+
+def _read_raw():
+    """Return the current bytes of IP_FILE, or None if it does not exist."""
+    try:
+        f = open(IP_FILE, 'rb')
+    except FileNotFoundError:
+        return None
+    with f:
+        return f.read()
+
+def _read_for_update():
+    """Read IP_FILE once for a read-modify-write.
+
+    Returns (raw bytes, IPs as an insertion-ordered dict with None values); the dict gives
+    O(1) membership, add and delete, and the raw bytes are reused for the backup.
+    """
+    raw = _read_raw()
+    return raw, dict.fromkeys(_parse_ips(raw.decode()) if raw else ())
+
+def _copy_file_attrs(fd, st):
+    """Give the open file fd the mode and, where permitted, the owner recorded in st.
+
+    Does nothing when st is None (there was no existing IP_FILE to copy from).
+    """
+    if st is None:
+        return
+    try:
+        os.fchown(fd, st.st_uid, st.st_gid)
+    except PermissionError:
+        pass  # Only root can give the file away; keep our own ownership
+    os.fchmod(fd, stat.S_IMODE(st.st_mode))
+
+def _write_atomic(new_bytes, old_bytes):
+    """Archive old_bytes to a versioned copy, then atomically replace IP_FILE with new_bytes.
+
+    The backup is written from the bytes already in memory rather than copied from disk,
+    and the new content goes to a temporary file that replaces IP_FILE so readers
+    never see a partially written file. Nothing is written when the content is unchanged.
+    """
+    if new_bytes == old_bytes:
+        return
+    
+    # Resolve symlinks so a linked feed file is updated in place rather than replaced by
+    # a regular file, and carry the existing file's mode and owner over to the new files.
+    target = os.path.realpath(IP_FILE)
+    try:
+        target_st = os.stat(target)
+    except FileNotFoundError:
+        target_st = None
+    
+    # Create backup with microsecond precision to avoid conflicts
+    if old_bytes is not None:
+        backup_name = _backup_name()
+        with open(backup_name, 'wb') as f:
+            _copy_file_attrs(f.fileno(), target_st)
+            f.write(old_bytes)
+        _prune_versions()
+    
+    # Write the new content to a per-writer temp file, then atomically replace IP_FILE.
+    # No lock is needed: os.replace() guarantees readers see either the old or new file.
+    tmp_name = f'{target}.tmp.{os.getpid()}.{threading.get_ident()}'
+    try:
+        with open(tmp_name, 'wb') as f:
+            _copy_file_attrs(f.fileno(), target_st)
+            f.write(new_bytes)
+        os.replace(tmp_name, target)
+    except OSError:
         try:
-            # Create backup with microsecond precision to avoid conflicts
-            if os.path.exists(IP_FILE):
-                timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-                backup_name = os.path.join(VERSIONS_DIR, f'allowed_ips_{timestamp}.txt')
-                shutil.copy2(IP_FILE, backup_name)
-            
-            # Write the new file with exclusive lock
-            with open(IP_FILE, 'w') as f:
-                fcntl.flock(f.fileno(), fcntl.LOCK_EX)  # Exclusive lock for writing
-                for ip in ips:
-                    f.write(ip + "\n")
-            break  # Success, exit retry loop
-            
-        except (IOError, OSError) as e:
-            if attempt < max_retries - 1:
-                time.sleep(0.1)  # Brief delay before retry
-                continue
-            else:
-                # If we can't get the lock after retries, raise the exception
-                raise e
+            os.remove(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+    _ip_cache["entry"] = (None, [])  # Force the next load_ips() to re-read
+
+def save_ips(ips, old_bytes=None):
+    """Before saving, archive the current file to a versioned copy, then write new content.
+
+    ips may be any iterable of IP strings, e.g. a list or the dict from _read_for_update().
+    Pass old_bytes when the caller has already read IP_FILE to avoid reading it again.
+    """
+    if old_bytes is None:
+        old_bytes = _read_raw()
+    data = "\n".join(ips)
+    if data:
+        data += "\n"
+    new_bytes = data.encode()
+    _write_atomic(new_bytes, old_bytes)
 
 def is_valid_ip(address):
     try:
@@ -74,63 +198,72 @@ def is_valid_ip(address):
     except ValueError:
         return False
 
+# Non-routable IPv4 ranges and the reason reported for them, sorted and non-overlapping
+_RESERVED_MSG = "Reserved or unspecified addresses are not allowed"
+_V4_BLOCKS = [
+    ('0.0.0.0/8', "Network 0.0.0.0/8 addresses are not allowed"),
+    ('10.0.0.0/8', "Private network addresses (RFC1918) are not allowed"),
+    ('127.0.0.0/8', "Loopback addresses (127.x.x.x) are not allowed"),
+    ('169.254.0.0/16', "APIPA/Link-local addresses (169.254.x.x) are not allowed"),
+    ('172.16.0.0/12', "Private network addresses (RFC1918) are not allowed"),
+    ('192.0.0.0/29', _RESERVED_MSG),
+    ('192.0.0.170/31', _RESERVED_MSG),
+    ('192.0.2.0/24', _RESERVED_MSG),
+    ('192.168.0.0/16', "Private network addresses (RFC1918) are not allowed"),
+    ('198.18.0.0/15', _RESERVED_MSG),
+    ('198.51.100.0/24', _RESERVED_MSG),
+    ('203.0.113.0/24', _RESERVED_MSG),
+    ('224.0.0.0/4', "Multicast addresses (224.x.x.x - 239.x.x.x) are not allowed"),
+    ('240.0.0.0/4', _RESERVED_MSG),
+]
+_V4_NETS = [ipaddress.ip_network(net) for net, _ in _V4_BLOCKS]
+_V4_LOWS = [int(net.network_address) for net in _V4_NETS]
+_V4_HIGHS = [int(net.broadcast_address) for net in _V4_NETS]
+_V4_MSGS = [msg for _, msg in _V4_BLOCKS]
+
 def is_internet_routable_ip(address):
     """Check if IP address is Internet-routable (not private, loopback, multicast, etc.)"""
     try:
         ip = ipaddress.ip_address(address)
         
-        # Reject IPv4 non-routable addresses
+        # Reject IPv4 non-routable addresses with a single lookup in the sorted range table
         if ip.version == 4:
-            # Loopback (127.0.0.0/8)
-            if ip.is_loopback:
-                return False, "Loopback addresses (127.x.x.x) are not allowed"
-            
-            # Private networks (RFC1918: 10.0.0.0/8, 172.16.0.0/12, 192.168.0.0/16)
-            if ip.is_private:
-                return False, "Private network addresses (RFC1918) are not allowed"
-            
-            # Multicast (224.0.0.0/4)
-            if ip.is_multicast:
-                return False, "Multicast addresses (224.x.x.x - 239.x.x.x) are not allowed"
-            
-            # Reserved/unspecified (0.0.0.0/8)
-            if ip.is_unspecified or ip.is_reserved:
-                return False, "Reserved or unspecified addresses are not allowed"
-            
-            # APIPA/Link-local (169.254.0.0/16)
-            if ip.is_link_local:
-                return False, "APIPA/Link-local addresses (169.254.x.x) are not allowed"
+            x = int(ip)
+            i = bisect.bisect_right(_V4_LOWS, x) - 1
+            if i >= 0 and x <= _V4_HIGHS[i]:
+                return False, _V4_MSGS[i]
             
             # Broadcast
-            if str(ip).endswith('.255'):
+            if (x & 0xFF) == 0xFF:
                 return False, "Broadcast addresses are not allowed"
-                
-            # Additional specific ranges to block
-            # 0.0.0.0/8 (this network)
-            if ipaddress.ip_address('0.0.0.0') <= ip <= ipaddress.ip_address('0.255.255.255'):
-                return False, "Network 0.0.0.0/8 addresses are not allowed"
-                
-        # Reject IPv6 non-routable addresses  
-        elif ip.version == 6:
-            if ip.is_loopback:
-                return False, "IPv6 loopback address (::1) is not allowed"
-            if ip.is_private:
-                return False, "IPv6 private addresses are not allowed"
-            if ip.is_multicast:
-                return False, "IPv6 multicast addresses are not allowed"
-            if ip.is_unspecified:
-                return False, "IPv6 unspecified address (::) is not allowed"
-            if ip.is_link_local:
-                return False, "IPv6 link-local addresses are not allowed"
-            if ip.is_reserved:
-                return False, "IPv6 reserved addresses are not allowed"
+            return True, None
+        
+        # Fast path: is_global already excludes private, loopback, link-local and
+        # unspecified addresses, but not multicast or the IPv6 reserved ranges
+        if ip.is_global and not ip.is_multicast and not ip.is_reserved:
+            return True, None
+        
+        # Otherwise walk the individual checks to report why it was rejected
+        # Reject IPv6 non-routable addresses
+        if ip.is_loopback:
+            return False, "IPv6 loopback address (::1) is not allowed"
+        if ip.is_private:
+            return False, "IPv6 private addresses are not allowed"
+        if ip.is_multicast:
+            return False, "IPv6 multicast addresses are not allowed"
+        if ip.is_unspecified:
+            return False, "IPv6 unspecified address (::) is not allowed"
+        if ip.is_link_local:
+            return False, "IPv6 link-local addresses are not allowed"
+        if ip.is_reserved:
+            return False, "IPv6 reserved addresses are not allowed"
                 
         return True, None
         
     except ValueError:
         return False, "Invalid IP address format"
 
-# Professional template with Bootstrap styling
+# Professional template with Bootstrap styling (assets are served locally from static/)
 HTML_TEMPLATE = """
 <!doctype html>
 <html lang="en">
@@ -138,8 +271,8 @@ HTML_TEMPLATE = """
     <meta charset="utf-8">
     <meta name="viewport" content="width=device-width, initial-scale=1">
     <title>Network Feed Manager</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/bootstrap-icons.css" rel="stylesheet">
+    <link href="{{ url_for('static', filename='css/bootstrap.min.css') }}" rel="stylesheet">
+    <link href="{{ url_for('static', filename='css/bootstrap-icons.min.css') }}" rel="stylesheet">
     <style>
         .ip-card { transition: all 0.2s ease; }
         .ip-card:hover { transform: translateY(-2px); box-shadow: 0 4px 8px rgba(0,0,0,0.1); }
@@ -174,31 +307,13 @@ HTML_TEMPLATE = """
                     <div class="card-header bg-white">
                         <h5 class="card-title mb-0">
                             <i class="bi bi-list-ul me-2"></i>Allowed IP Addresses
-                            <span class="badge bg-secondary ms-2">{{ ip_list|length }}</span>
+                            <span class="badge bg-secondary ms-2">{{ ip_count }}</span>
                         </h5>
                     </div>
                     <div class="card-body">
-                        {% if ip_list %}
+                        {% if ip_count %}
                             <div class="row g-3">
-                                {% for ip in ip_list %}
-                                <div class="col-md-6">
-                                    <div class="card ip-card h-100">
-                                        <div class="card-body d-flex justify-content-between align-items-center py-3">
-                                            <div>
-                                                <i class="bi bi-globe text-primary me-2"></i>
-                                                <code class="text-dark">{{ ip }}</code>
-                                            </div>
-                                            <form action="{{ url_for('delete_ip') }}" method="post" class="d-inline">
-                                                <input type="hidden" name="ip" value="{{ ip }}">
-                                                <button type="submit" class="btn btn-outline-danger btn-delete" 
-                                                        onclick="return confirm('Remove {{ ip }}?')">
-                                                    <i class="bi bi-trash"></i>
-                                                </button>
-                                            </form>
-                                        </div>
-                                    </div>
-                                </div>
-                                {% endfor %}
+                                {{ ip_cards|safe }}
                             </div>
                         {% else %}
                             <div class="text-center py-5 text-muted">
@@ -251,15 +366,137 @@ HTML_TEMPLATE = """
         </div>
     </div>
 
-    <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
+    <script src="{{ url_for('static', filename='js/popper.min.js') }}"></script>
+    <script src="{{ url_for('static', filename='js/bootstrap.min.js') }}"></script>
 </body>
 </html>
 """
 
+# Markup for a single IP card on the index page, filled in with str.format() in index().
+# Building the repeated cards in Python avoids a url_for() call and autoescape per IP in Jinja.
+CARD_TEMPLATE = """
+<div class="col-md-6">
+    <div class="card ip-card h-100">
+        <div class="card-body d-flex justify-content-between align-items-center py-3">
+            <div>
+                <i class="bi bi-globe text-primary me-2"></i>
+                <code class="text-dark">{ip}</code>
+            </div>
+            <form action="{delete_url}" method="post" class="d-inline">
+                <input type="hidden" name="ip" value="{ip}">
+                <button type="submit" class="btn btn-outline-danger btn-delete" 
+                        onclick="return confirm('Remove {ip}?')">
+                    <i class="bi bi-trash"></i>
+                </button>
+            </form>
+        </div>
+    </div>
+</div>
+"""
+
+# Professional versions page template
+VERSIONS_TEMPLATE = """
+<!doctype html>
+<html lang="en">
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <title>Version History - Network Feed Manager</title>
+    <link href="{{ url_for('static', filename='css/bootstrap.min.css') }}" rel="stylesheet">
+    <link href="{{ url_for('static', filename='css/bootstrap-icons.min.css') }}" rel="stylesheet">
+</head>
+<body class="bg-light">
+    <nav class="navbar navbar-expand-lg navbar-dark bg-primary mb-4">
+        <div class="container">
+            <a class="navbar-brand" href="{{ url_for('index') }}">
+                <i class="bi bi-shield-check me-2"></i>Network Feed Manager
+            </a>
+            <span class="navbar-text">Version History</span>
+        </div>
+    </nav>
+
+    <div class="container">
+        <div class="row justify-content-center">
+            <div class="col-lg-8">
+                <div class="card shadow-sm">
+                    <div class="card-header bg-white d-flex justify-content-between align-items-center">
+                        <h5 class="card-title mb-0">
+                            <i class="bi bi-clock-history me-2"></i>Version History
+                        </h5>
+                        <a href="{{ url_for('index') }}" class="btn btn-outline-primary btn-sm">
+                            <i class="bi bi-arrow-left me-1"></i>Back to Main
+                        </a>
+                    </div>
+                    <div class="card-body">
+                        {% if backups %}
+                            <form method="post">
+                                <div class="list-group">
+                                    {% for bf in backups %}
+                                    <div class="list-group-item d-flex justify-content-between align-items-center">
+                                        <div>
+                                            <i class="bi bi-file-text text-primary me-2"></i>
+                                            <strong>{{ bf }}</strong>
+                                            <br>
+                                            <small class="text-muted">
+                                                {% set parts = bf.replace('allowed_ips_', '').replace('.txt', '').split('_') %}
+                                                {% if parts|length >= 2 %}
+                                                    {{ parts[0][:4] }}-{{ parts[0][4:6] }}-{{ parts[0][6:8] }} 
+                                                    {{ parts[1][:2] }}:{{ parts[1][2:4] }}:{{ parts[1][4:6] }}
+                                                {% endif %}
+                                            </small>
+                                        </div>
+                                        <button type="submit" name="version_file" value="{{ bf }}" 
+                                                class="btn btn-warning btn-sm"
+                                                onclick="return confirm('Rollback to this version? This will replace the current configuration.')">
+                                            <i class="bi bi-arrow-counterclockwise me-1"></i>Rollback
+                                        </button>
+                                    </div>
+                                    {% endfor %}
+                                </div>
+                            </form>
+                        {% else %}
+                            <div class="text-center py-5 text-muted">
+                                <i class="bi bi-archive display-1"></i>
+                                <p class="mt-3">No backup versions available yet</p>
+                                <small>Versions are created automatically when you make changes</small>
+                            </div>
+                        {% endif %}
+                    </div>
+                </div>
+            </div>
+        </div>
+    </div>
+
+    <script src="{{ url_for('static', filename='js/popper.min.js') }}"></script>
+    <script src="{{ url_for('static', filename='js/bootstrap.min.js') }}"></script>
+</body>
+</html>
+"""
+
+# Compile the templates once at import instead of on every request
+_INDEX_TMPL = app.jinja_env.from_string(HTML_TEMPLATE)
+_VERSIONS_TMPL = app.jinja_env.from_string(VERSIONS_TEMPLATE)
+
 @app.route('/')
 def index():
-    ips = load_ips()
-    return render_template_string(HTML_TEMPLATE, ip_list=ips)
+    ips, key = load_ips()
+    # The page only depends on the IP file and any pending flash messages, so let the
+    # browser revalidate with an ETag derived from the key the list was loaded under
+    etag = '-'.join(map(str, key or (0,))) + f'-{len(ips)}'
+    has_flashes = bool(get_flashed_messages())
+    if not has_flashes and request.if_none_match.contains_weak(etag):
+        resp = make_response('', 304)
+    else:
+        delete_url = escape(url_for('delete_ip'))
+        ip_cards = "".join(CARD_TEMPLATE.format(ip=escape(ip), delete_url=delete_url) for ip in ips)
+        resp = make_response(_INDEX_TMPL.render(ip_count=len(ips), ip_cards=ip_cards))
+    if has_flashes:
+        # Flash messages are one-off; a cached copy would show them again on revalidation
+        resp.headers['Cache-Control'] = 'no-store'
+    else:
+        resp.set_etag(etag, weak=True)
+        resp.headers['Cache-Control'] = 'private, must-revalidate'
+    return resp
 
 @app.route('/add', methods=['POST'])
 def add_ip():
@@ -277,124 +514,68 @@ def add_ip():
         flash(f"{ip}: {error_msg}")
         return redirect(url_for('index'))
 
-    ips = load_ips()
+    raw, ips = _read_for_update()
     # Allow duplicates? If not, uncomment the next two lines.
     if ip in ips:
         flash(f"{ip} is already in the list.")
         return redirect(url_for('index'))
 
-    ips.append(ip)
-    save_ips(ips)
+    ips[ip] = None
+    save_ips(ips, raw)
     flash(f"Added IP {ip}.")
     return redirect(url_for('index'))
 
 @app.route('/delete', methods=['POST'])
 def delete_ip():
     ip_to_delete = request.form.get('ip', '').strip()
-    ips = load_ips()
+    raw, ips = _read_for_update()
     if ip_to_delete not in ips:
         flash(f"IP {ip_to_delete} not found.")
         return redirect(url_for('index'))
 
-    ips.remove(ip_to_delete)
-    save_ips(ips)
+    del ips[ip_to_delete]
+    save_ips(ips, raw)
     flash(f"Deleted IP {ip_to_delete}.")
     return redirect(url_for('index'))
 
 # Endpoint to list version backups and rollback to a chosen version.
 @app.route('/versions', methods=['GET', 'POST'])
 def versions():
-    backups = sorted(os.listdir(VERSIONS_DIR), reverse=True)
+    # The mtime-keyed cache can lag behind another worker's pruning, so a rollback is
+    # validated against a fresh scan of VERSIONS_DIR
+    backups = list_versions(use_cache=request.method != 'POST')
     if request.method == 'POST':
         version_file = request.form.get('version_file')
         if version_file and version_file in backups:
-            # Copy the backup file to our main file.
+            # Replace the main file with the backup, archiving the state being replaced.
             backup_path = os.path.join(VERSIONS_DIR, version_file)
-            shutil.copy2(backup_path, IP_FILE)
+            try:
+                with open(backup_path, 'rb') as f:
+                    backup_bytes = f.read()
+            except FileNotFoundError:
+                # Pruned by a concurrent save since the scan above
+                flash("Invalid version selected.")
+                return redirect(url_for('versions'))
+            _write_atomic(backup_bytes, _read_raw())
             flash(f"Rolled back to version {version_file}.")
             return redirect(url_for('index'))
         else:
             flash("Invalid version selected.")
             return redirect(url_for('versions'))
 
-    # Professional versions page template
-    version_html = """
-    <!doctype html>
-    <html lang="en">
-    <head>
-        <meta charset="utf-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>Version History - Network Feed Manager</title>
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/bootstrap-icons.css" rel="stylesheet">
-    </head>
-    <body class="bg-light">
-        <nav class="navbar navbar-expand-lg navbar-dark bg-primary mb-4">
-            <div class="container">
-                <a class="navbar-brand" href="{{ url_for('index') }}">
-                    <i class="bi bi-shield-check me-2"></i>Network Feed Manager
-                </a>
-                <span class="navbar-text">Version History</span>
-            </div>
-        </nav>
-
-        <div class="container">
-            <div class="row justify-content-center">
-                <div class="col-lg-8">
-                    <div class="card shadow-sm">
-                        <div class="card-header bg-white d-flex justify-content-between align-items-center">
-                            <h5 class="card-title mb-0">
-                                <i class="bi bi-clock-history me-2"></i>Version History
-                            </h5>
-                            <a href="{{ url_for('index') }}" class="btn btn-outline-primary btn-sm">
-                                <i class="bi bi-arrow-left me-1"></i>Back to Main
-                            </a>
-                        </div>
-                        <div class="card-body">
-                            {% if backups %}
-                                <form method="post">
-                                    <div class="list-group">
-                                        {% for bf in backups %}
-                                        <div class="list-group-item d-flex justify-content-between align-items-center">
-                                            <div>
-                                                <i class="bi bi-file-text text-primary me-2"></i>
-                                                <strong>{{ bf }}</strong>
-                                                <br>
-                                                <small class="text-muted">
-                                                    {% set parts = bf.replace('allowed_ips_', '').replace('.txt', '').split('_') %}
-                                                    {% if parts|length >= 2 %}
-                                                        {{ parts[0][:4] }}-{{ parts[0][4:6] }}-{{ parts[0][6:8] }} 
-                                                        {{ parts[1][:2] }}:{{ parts[1][2:4] }}:{{ parts[1][4:6] }}
-                                                    {% endif %}
-                                                </small>
-                                            </div>
-                                            <button type="submit" name="version_file" value="{{ bf }}" 
-                                                    class="btn btn-warning btn-sm"
-                                                    onclick="return confirm('Rollback to this version? This will replace the current configuration.')">
-                                                <i class="bi bi-arrow-counterclockwise me-1"></i>Rollback
-                                            </button>
-                                        </div>
-                                        {% endfor %}
-                                    </div>
-                                </form>
-                            {% else %}
-                                <div class="text-center py-5 text-muted">
-                                    <i class="bi bi-archive display-1"></i>
-                                    <p class="mt-3">No backup versions available yet</p>
-                                    <small>Versions are created automatically when you make changes</small>
-                                </div>
-                            {% endif %}
-                        </div>
-                    </div>
-                </div>
-            </div>
-        </div>
-
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
-    </body>
-    </html>
-    """
-    return render_template_string(version_html, backups=backups)
+    return _VERSIONS_TMPL.render(backups=backups)
 
 if __name__ == "__main__":
-    app.run(debug=True, port=5000)
+    # For production, prefer a pre-forking WSGI server, e.g.:
+    #   gunicorn -w 4 -k gthread --threads 2 -b 127.0.0.1:5000 nf-gui:app
+    # Each worker keeps its own IP cache; every save gives the file a new inode, keeping them in sync.
+    if os.environ.get('NF_GUI_DEBUG') == '1':
+        app.run(debug=True, port=5000)
+    else:
+        try:
+            from waitress import serve
+        except ImportError:
+            print("waitress is not installed, falling back to the Flask development server")
+            app.run(port=5000, threaded=True)
+        else:
+            serve(app, host='127.0.0.1', port=5000, threads=8)